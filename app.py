@@ -4,9 +4,10 @@ eventlet.monkey_patch() # 用這個才可以讓async_mode = 'eventlet' 正常運
 from flask import Flask, render_template, request
 from flask_socketio import SocketIO, emit, join_room, leave_room
 #from flask_cors import CORS
-from datetime import datetime
+import time
 from typing import Dict
 import logging
+import orjson
 
 from binance_websocket import BinanceWebSocket
 from bybit_websocket import BybitWebSocket
@@ -17,9 +18,19 @@ from bitget_websocket import BitgetWebSocket
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class OrjsonModule:
+    """給 python-socketio 使用的 json 模組，以 orjson 編解碼封包"""
+    @staticmethod
+    def dumps(obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
 #CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet', json=OrjsonModule)
 
 BASIC_COIN_LIST = {
     'BTC': 'Bitcoin',
@@ -32,31 +43,69 @@ BASIC_COIN_LIST = {
     'MATIC': 'Polygon',
 }
 
+ROOM_NAMES: Dict[str, str] = {symbol: f'coin_{symbol}' for symbol in BASIC_COIN_LIST}  # {coin_symbol: room 名稱}
+
+FLUSH_INTERVAL = 0.05  # 價格批次推送週期（秒）
+
 # Global variables
 price_cache: Dict[str, Dict[str, float]] = {}  # {coin: {exchange: price}}
+pending_updates: Dict[str, Dict[str, float]] = {}  # {coin: {exchange: price}} - 等待下一次批次推送的最新價格
 user_watching: Dict[str, str] = {}  # {session_id: coin_symbol} - 追蹤每個使用者正在查看的幣種
 active_subscriptions: Dict[str, int] = {}  # {coin_symbol: count} - 追蹤每個幣種的訂閱數量
 ws_pool = []
 
+def room_name(symbol: str) -> str:
+    """
+    取得幣種對應的 room 名稱
+    預設幣種使用預先建立的字串，其他幣種才即時組字串（不快取使用者輸入，避免無限增長）
+    """
+    return ROOM_NAMES.get(symbol) or f'coin_{symbol}'
+
+def now_ms() -> int:
+    """目前時間（epoch 毫秒），作為推送訊息的 ts 欄位"""
+    return time.time_ns() // 1_000_000
+
 def on_price_update(symbol: str, price: float, exchange: str): # TODO: timestamp
     """
     通用價格更新處理函數
+    只更新快取，實際推送交給 flush_price_updates 批次處理
     """
     # 更新價格快取
-    logger.debug(f"價格更新: {exchange} {symbol} = ${price:,.2f}")
+    logger.debug("價格更新: %s %s = $%.2f", exchange, symbol, price)
     if symbol not in price_cache:
         price_cache[symbol] = {}
     price_cache[symbol][exchange] = price
-    logger.debug(f"價格更新快取: {exchange} {symbol} = ${price:,.2f}")
-    # 只發送給正在查看這個幣種的使用者
-    socketio.emit('price_update', {
-        'symbol': symbol,
-        'exchange': exchange,
-        'price': price,
-        'timestamp': datetime.now().isoformat()
-    }, room=f'coin_{symbol}')
-    
-    logger.debug(f"價格更新已發送到 room coin_{symbol}: {exchange} {symbol} = ${price:,.2f}")
+    # 同一週期內同一交易所只保留最新價格
+    if symbol not in pending_updates:
+        pending_updates[symbol] = {}
+    pending_updates[symbol][exchange] = price
+
+def flush_price_updates():
+    """
+    背景任務：每 FLUSH_INTERVAL 秒將累積的價格合併，每個幣種 room 只發送一次
+    """
+    global pending_updates
+    # 每個幣種重複使用同一個訊息 dict；emit 會當下完成序列化，之後修改不影響已送出的封包
+    payloads: Dict[str, dict] = {}
+    while True:
+        socketio.sleep(FLUSH_INTERVAL)
+        if not pending_updates:
+            continue
+        # 整批換出，之後的更新寫入新的 dict
+        updates, pending_updates = pending_updates, {}
+        ts = now_ms()
+        for symbol, prices in updates.items():
+            try:
+                payload = payloads.get(symbol)
+                if payload is None:
+                    payload = payloads[symbol] = {'symbol': symbol, 'prices': None, 'ts': 0}
+                payload['prices'] = prices
+                payload['ts'] = ts
+                # 只發送給正在查看這個幣種的使用者
+                socketio.emit('price_update', payload, room=room_name(symbol))
+                logger.debug("價格更新已發送到 room coin_%s: %s", symbol, prices)
+            except Exception as e:
+                logger.error(f"發送價格更新時發生錯誤: {e}")
 
 def exchange_status_emit(exchange: str, status: str):
     try:
@@ -64,7 +113,7 @@ def exchange_status_emit(exchange: str, status: str):
             'exchange': exchange.lower(),
             'status': status,
         })
-        logger.debug(f"交易所狀態已發送: {exchange} 狀態 {status}")
+        logger.debug("交易所狀態已發送: %s 狀態 %s", exchange, status)
     except Exception as e:
         logger.error(f"發送交易所狀態時發生錯誤: {e}")
 
@@ -72,25 +121,27 @@ def update_subscriptions(symbol: str, increment: bool = True):
     """
     更新幣種訂閱計數
     """
-    if increment:
-        active_subscriptions[symbol] = active_subscriptions.get(symbol, 0) + 1
-        logger.debug(f"{symbol} 訂閱數增加到 {active_subscriptions[symbol]}")
-        
-        # 如果是第一次訂閱，通知 WebSocket 開始接收該幣種資料
-        if active_subscriptions[symbol] == 1:
-            for ws in ws_pool:
-                ws.subscribe(symbol)
-            logger.debug(f"開始訂閱 Binance {symbol} 資料")
+    before = active_subscriptions.get(symbol, 0)
+    if not increment and before == 0:
+        return
+    after = before + 1 if increment else before - 1
+    if after:
+        active_subscriptions[symbol] = after
     else:
-        if symbol in active_subscriptions:
-            active_subscriptions[symbol] = max(0, active_subscriptions[symbol] - 1)
-            logger.debug(f"{symbol} 訂閱數減少到 {active_subscriptions[symbol]}")
-            
-            # 如果沒有人訂閱了，取消 WebSocket 訂閱
-            if active_subscriptions[symbol] == 0:
-                for ws in ws_pool:
-                    ws.unsubscribe(symbol) 
-                logger.debug(f"停止訂閱 Binance {symbol} 資料")
+        # 沒有人訂閱時移除，避免 dict 累積任意幣種代號
+        del active_subscriptions[symbol]
+    logger.debug(f"{symbol} 訂閱數變為 {after}")
+
+    if before == 0:
+        # 如果是第一次訂閱，通知 WebSocket 開始接收該幣種資料
+        for ws in ws_pool:
+            ws.subscribe(symbol)
+        logger.debug(f"開始訂閱 {symbol} 資料")
+    elif after == 0:
+        # 如果沒有人訂閱了，取消 WebSocket 訂閱
+        for ws in ws_pool:
+            ws.unsubscribe(symbol)
+        logger.debug(f"停止訂閱 {symbol} 資料")
 
 
 @app.route('/')
@@ -122,7 +173,7 @@ def handle_disconnect():
     # 如果使用者正在查看某個幣種，取消訂閱
     if request.sid in user_watching:
         symbol = user_watching[request.sid]
-        leave_room(f'coin_{symbol}')
+        leave_room(room_name(symbol))
         update_subscriptions(symbol, increment=False)
         del user_watching[request.sid]
         logger.debug(f"使用者 {request.sid} 離開，取消 {symbol} 訂閱")
@@ -139,27 +190,26 @@ def handle_watch_coin(data):
     if request.sid in user_watching:
         old_symbol = user_watching[request.sid]
         if old_symbol != symbol:
-            leave_room(f'coin_{old_symbol}')
+            leave_room(room_name(old_symbol))
             update_subscriptions(old_symbol, increment=False)
             logger.debug(f"使用者 {request.sid} 從 {old_symbol} 切換到 {symbol}")
     
     # 記錄使用者正在查看這個幣種
     user_watching[request.sid] = symbol
-    join_room(f'coin_{symbol}')
+    join_room(room_name(symbol))
     update_subscriptions(symbol, increment=True)
     
     logger.debug(f"使用者 {request.sid} 開始查看 {symbol}")
     
-    # 發送當前快取的價格（如果有）
-    if symbol in price_cache :
-        for exchange, price in price_cache[symbol].items():
-            emit('price_update', {
-                'symbol': symbol,
-                'exchange': exchange,
-                'price': price,
-                'timestamp': datetime.now().isoformat()
-            }, room=f'coin_{symbol}')
-            logger.debug(f"發送快取價格到 room coin_{symbol}: {exchange} {symbol} = ${price:,.2f}")
+    # 發送當前快取的價格（如果有），所有交易所合併在同一個訊息
+    # 只發給剛加入的使用者，room 內其他人已經有這些價格
+    if price_cache.get(symbol):
+        emit('price_update', {
+            'symbol': symbol,
+            'prices': price_cache[symbol],
+            'ts': now_ms()
+        }, to=request.sid)
+        logger.debug(f"發送快取價格到 {request.sid}: {symbol} {price_cache[symbol]}")
     emit('watch_response', {'status': 'success', 'symbol': symbol})
 
 
@@ -171,7 +221,7 @@ def handle_unwatch_coin(data):
     symbol = data.get('symbol', '').upper()
     
     if request.sid in user_watching and user_watching[request.sid] == symbol:
-        leave_room(f'coin_{symbol}')
+        leave_room(room_name(symbol))
         update_subscriptions(symbol, increment=False)
         del user_watching[request.sid]
         logger.debug(f"使用者 {request.sid} 停止查看 {symbol}")
@@ -188,6 +238,7 @@ if __name__ == '__main__':
     ws_pool.append(BitgetWebSocket(callback=on_price_update, status_callback=exchange_status_emit))
     for ws in ws_pool:
         ws.start()
+    socketio.start_background_task(flush_price_updates)
 
     try:
         # 啟動 Flask-SocketIO 伺服器
@@ -1,14 +1,21 @@
-import json
+import orjson
+import random
+import sys
 import threading
 import time
 import websocket
-from typing import Callable, Dict, Set
+from typing import Callable, Dict, List, Set, Union
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _canon(symbol: str) -> str:
+    """統一幣種代號：轉大寫並 intern，讓同一幣種在各處共用同一個字串物件"""
+    return sys.intern(symbol.upper())
+
+
 class BasicWebSocket:
     def __init__(self, callback: Callable[[str, float, str], None], status_callback: Callable[[str, str], None]):
         """
@@ -25,7 +32,14 @@ class BasicWebSocket:
         self.is_running = False
         self.subscribed_symbols: Set[str] = set()
         self.last_prices: Dict[str, float] = {}  # 記錄上次價格，用於判斷是否變動
-        self.reconnect_delay = 5  # 重連延遲（秒）
+        self._last_price_str: Dict[str, Union[str, bytes]] = {}  # 記錄上次的原始價格字串（解析後為 str，未解析的原始訊息為 bytes），未變動時可略過 float 轉換
+        self._full_to_base: Dict[str, str] = {}  # {交易對名稱: 幣種} e.g. {'BTCUSDT': 'BTC'}，只包含已訂閱的幣種
+        self._raw_to_base: Dict[bytes, str] = {}  # 同上，以 bytes 為 key，供解析 JSON 前直接比對原始訊息 e.g. {b'BTCUSDT': 'BTC'}
+        self.reconnect_delay = 1  # 重連延遲基準（秒），每次連續失敗加倍
+        self.max_reconnect_delay = 60  # 重連延遲上限（秒）
+        self._reconnect_attempt = 0  # 連續重連次數，連線確認正常（收到 pong）後歸零
+        self.ping_interval = 20  # 傳輸層 ping 間隔（秒），用來及早發現斷線
+        self.ping_timeout = 10  # 等待 pong 的逾時（秒）
         self.exchange_name = None
         self.base_url = None
         
@@ -52,9 +66,12 @@ class BasicWebSocket:
         訂閱特定加密貨幣的價格更新
         symbol: ex. BTC or ETH
         """
-        symbol = symbol.upper()
+        symbol = _canon(symbol)
         if symbol not in self.subscribed_symbols:
             self.subscribed_symbols.add(symbol)
+            full_symbol = self._full_symbol(symbol)
+            self._full_to_base[full_symbol] = symbol
+            self._raw_to_base[full_symbol.encode()] = symbol
             logger.debug(f"已訂閱 {self.exchange_name} {symbol} 價格更新")
             
             try:
@@ -68,10 +85,13 @@ class BasicWebSocket:
         取消訂閱特定加密貨幣
         symbol: ex. BTC or ETH
         """
-        symbol = symbol.upper()
+        symbol = _canon(symbol)
         if symbol in self.subscribed_symbols:
             # 先從本地清單移除，若 WebSocket 仍然可用則嘗試發送取消訂閱
             self.subscribed_symbols.remove(symbol)
+            full_symbol = self._full_symbol(symbol)
+            self._full_to_base.pop(full_symbol, None)
+            self._raw_to_base.pop(full_symbol.encode(), None)
             logger.debug(f"已取消訂閱 {self.exchange_name} {symbol}")
 
             try:
@@ -83,6 +103,11 @@ class BasicWebSocket:
             # 清除該幣種的最後價格記錄
             if symbol in self.last_prices:
                 del self.last_prices[symbol]
+            self._last_price_str.pop(symbol, None)
+
+    def _full_symbol(self, symbol: str) -> str:
+        """交易所訊息中的交易對名稱 e.g. BTC -> BTCUSDT"""
+        return f"{symbol}USDT"
 
     def _disconnect(self):
         """斷開 WebSocket"""
@@ -102,17 +127,15 @@ class BasicWebSocket:
         if not self.is_running:
             return
 
-        subscribe_msg = self._creat_subscribe_msg(symbol, 'subscribe')
-
         if not ws:
             # 尚未建立 ws 連線，訂閱會在 on_open 裡送出
             logger.warning(f"_subscribe: ws 尚未就緒，延後發送 {symbol} 訂閱")
             return
         try:
-            msg_text = json.dumps(subscribe_msg)
-            logger.debug(f"_subscribe -> 將送出給 {self.exchange_name}: {msg_text}")
-            ws.send(msg_text)
-            logger.debug(f"已向 {self.exchange_name} WebSocket 發送訂閱請求: {symbol}USDT")
+            payload = orjson.dumps(self._creat_subscribe_msg(symbol, 'subscribe'))
+            logger.debug("_subscribe -> 將送出給 %s: %s", self.exchange_name, payload)
+            ws.send(payload)
+            logger.debug("已向 %s WebSocket 發送訂閱請求: %sUSDT", self.exchange_name, symbol)
         except Exception:
             logger.exception(f"發送訂閱請求 {symbol}USDT 時發生錯誤")
 
@@ -121,14 +144,12 @@ class BasicWebSocket:
         if not self.is_running:
             return
 
-        unsubscribe_msg = self._creat_subscribe_msg(symbol, 'unsubscribe')
-
         if not ws:
             logger.warning(f"_unsubscribe: ws 尚未就緒，無法發送取消訂閱 {symbol}")
             return
         try:
-            ws.send(json.dumps(unsubscribe_msg))
-            logger.debug(f"已向 {self.exchange_name} WebSocket 發送取消訂閱請求: {symbol}USDT")
+            ws.send(orjson.dumps(self._creat_subscribe_msg(symbol, 'unsubscribe')))
+            logger.debug("已向 %s WebSocket 發送取消訂閱請求: %sUSDT", self.exchange_name, symbol)
         except Exception:
             logger.exception(f"發送取消訂閱請求 {symbol}USDT 時發生錯誤")
 
@@ -136,6 +157,13 @@ class BasicWebSocket:
     def _creat_subscribe_msg(self, symbol: str, type: str):
         pass
 
+    def _creat_bulk_subscribe_msgs(self, symbols: List[str], type: str) -> List[dict]:
+        """
+        生成多幣種的訂閱訊息列表
+        預設每個幣種一則訊息；支援合併訂閱的交易所可覆寫成較少的訊息
+        """
+        return [self._creat_subscribe_msg(symbol, type) for symbol in symbols]
+
     def _run(self):
         """主運行迴圈"""
         while self.is_running:
@@ -160,37 +188,63 @@ class BasicWebSocket:
                     on_error=self._on_error,
                     on_close=self._on_close,
                     on_ping=self._on_ping,
+                    on_pong=self._on_pong,
                 )
                 
                 self._emit_status('connected')
                 # 運行 WebSocket（這會阻塞直到連接關閉）
-                self.ws.run_forever()
+                # 交易所送來的都是 JSON，略過逐 frame 的 UTF-8 驗證，_on_message 會直接收到 bytes
+                self.ws.run_forever(
+                    skip_utf8_validation=True,
+                    ping_interval=self.ping_interval,
+                    ping_timeout=self.ping_timeout,
+                )
                 
                 # 如果還在運行中，等待後重連
                 if self.is_running:
-                    logger.warning(f"{self.exchange_name} WebSocket 已斷開，{self.reconnect_delay} 秒後重連...")
-                    time.sleep(self.reconnect_delay)
+                    delay = self._next_reconnect_delay()
+                    logger.warning(f"{self.exchange_name} WebSocket 已斷開，{delay:.1f} 秒後重連...")
+                    time.sleep(delay)
                     
             except Exception as e:
                 logger.error(f"{self.exchange_name} WebSocket 錯誤: {e}")
                 if self.is_running:
-                    time.sleep(self.reconnect_delay)
+                    time.sleep(self._next_reconnect_delay())
+
+    def _next_reconnect_delay(self) -> float:
+        """
+        計算下一次重連前的等待時間（full jitter 指數退避）
+        在 [0, min(上限, 基準 * 2^次數)] 之間隨機取值，避免交易所斷線後所有連線同時湧入
+        """
+        cap = min(self.max_reconnect_delay, self.reconnect_delay * (2 ** self._reconnect_attempt))
+        self._reconnect_attempt += 1
+        return random.uniform(0, cap)
 
     def _on_open(self, ws):
         """WebSocket 連接建立時的callback"""
         logger.debug(f"{self.exchange_name} WebSocket 連接已建立")
-        # 連線建立後，向交易所發送目前已登記的所有訂閱
+        # 連線建立後，向交易所發送目前已登記的所有訂閱（盡量合併成少數幾個 frame）
         try:
-            for symbol in list(self.subscribed_symbols):
-                try:
-                    self._subscribe(ws, symbol)
-                except Exception:
-                    logger.exception(f"向 {self.exchange_name} 發送訂閱 {symbol} 時發生錯誤")
+            symbols = list(self.subscribed_symbols)
+            if symbols and self.is_running:
+                for msg in self._creat_bulk_subscribe_msgs(symbols, 'subscribe'):
+                    try:
+                        ws.send(orjson.dumps(msg))
+                    except Exception:
+                        logger.exception(f"向 {self.exchange_name} 發送訂閱 {symbols} 時發生錯誤")
+                logger.debug(f"已向 {self.exchange_name} WebSocket 發送訂閱請求: {symbols}")
             self._emit_status('connected')
         except Exception:
             logger.exception("在 on_open 處理訂閱時發生未預期錯誤")
 
     def _on_message(self, ws, message):
+        """
+        接收到 WebSocket 訊息時的callback，由各交易所實作
+
+        Args:
+            ws: WebSocket 物件
+            message: 接收到的訊息，為原始 bytes（_run 以 skip_utf8_validation 執行，不會解碼成 str）
+        """
         pass
 
     def _on_error(self, ws, error):
@@ -207,12 +261,16 @@ class BasicWebSocket:
     def _on_ping(self, ws, message):
         """WebSocket 收到 ping 時的callback"""
         # 預設不回送應用層 pong（避免對期望傳輸層 ping/pong 的伺服器產生無效請求）
-        logger.debug(f"收到 {self.exchange_name} WebSocket ping (略過應用層回覆) ")
+        logger.debug("收到 %s WebSocket ping (略過應用層回覆) ", self.exchange_name)
+
+    def _on_pong(self, ws, message):
+        """WebSocket 收到 pong 時的callback，代表連線正常，重連退避歸零"""
+        self._reconnect_attempt = 0
 
     def _emit_status(self, status: str):
         try:
             if self.status_callback and self.exchange_name:
                 self.status_callback(self.exchange_name, status)
-                logger.debug(f"已發送 {self.exchange_name} 狀態: {status}")
+                logger.debug("已發送 %s 狀態: %s", self.exchange_name, status)
         except Exception:
             logger.exception("發送狀態更新時發生錯誤")
\ No newline at end of file
@@ -1,19 +1,24 @@
-import json
+import itertools
+import orjson
+import re
 import time
-from typing import Callable
+from typing import Callable, List
 from basic_websocket import BasicWebSocket
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 從原始 trade 訊息擷取 symbol 與 price，用於在解析 JSON 前判斷價格是否變動
+TRADE_PRICE_RE = re.compile(rb'"s":"([A-Z0-9]+)".*?"p":"([^"]+)"')
 
 class BinanceWebSocket(BasicWebSocket):
     def __init__(self, callback: Callable[[str, float, str], None], status_callback: Callable[[str, str], None]):
         super().__init__(callback, status_callback)
         self.exchange_name = 'Binance'
         self.base_url = "wss://stream.binance.com:9443/ws"
-      
+        self._id_gen = itertools.count(1)  # 訂閱請求的 id
+
     def _on_message(self, ws, message):
         """
         接收到 WebSocket 訊息時的callback
@@ -23,25 +28,31 @@ class BinanceWebSocket(BasicWebSocket):
             message: 接收到的訊息
         """
         try:
-            data = json.loads(message)
-            # 處理組合串流格式
-            if 'stream' in data:
-                data = data['data']
-            
-            # Binance trade stream 格式
+            # 非 trade 訊息（e.g. 訂閱回覆 {"result":null,"id":1}）、未訂閱的交易對
+            # 或價格字串與上次相同時直接略過，不做完整 JSON 解析
+            match = TRADE_PRICE_RE.search(message)
+            if match is None:
+                return
+            symbol_raw, price_raw = match.groups()
+            symbol = self._raw_to_base.get(symbol_raw)  # ex. b'BTCUSDT' -> BTC，未訂閱的交易對為 None
+            last_price_str = self._last_price_str
+            if symbol is None or last_price_str.get(symbol) == price_raw:
+                return
+            last_price_str[symbol] = price_raw
+
+            data = orjson.loads(message)
+            # Binance trade stream 格式（連線的是 /ws 原始串流，訊息不會包在 {"stream", "data"} 裡）
             if 's' in data and 'p' in data:
-                symbol_full = data['s']  # ex. BTCUSDT
-                if symbol_full.endswith('USDT'):
-                    symbol = symbol_full[:-4]  #  BTC
-                    price = float(data['p'])
-                    
-                    # 只有當價格變動時才 callback
-                    if symbol not in self.last_prices or self.last_prices[symbol] != price:
-                        self.last_prices[symbol] = price
-                        self.callback(symbol, price, 'binance')
-                        logger.debug(f"Binance {symbol} 價格更新: ${price:,.2f}")
+                price = float(data['p'])
+
+                # 只有當價格變動時才 callback（第一次收到時 get 為 None，必定不相等）
+                last_prices = self.last_prices
+                if last_prices.get(symbol) != price:
+                    last_prices[symbol] = price
+                    self.callback(symbol, price, 'binance')
+                    logger.debug("Binance %s 價格更新: $%.2f", symbol, price)
                         
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"JSON 解析錯誤: {e}")
         except Exception as e:
             logger.error(f"處理訊息時發生錯誤: {e}")
@@ -54,9 +65,17 @@ class BinanceWebSocket(BasicWebSocket):
             [
             f"{symbol.lower()}usdt@trade",
             ],
-            "id": time.time_ns() % (10 ** 8)
+            "id": next(self._id_gen)
         }
 
+    def _creat_bulk_subscribe_msgs(self, symbols: List[str], type: str):
+        """生成 Binance 合併訂閱訊息，params 可一次帶入多個 stream"""
+        return [{
+            "method": type.upper(),
+            "params": [f"{symbol.lower()}usdt@trade" for symbol in symbols],
+            "id": next(self._id_gen)
+        }]
+
 # 測試用程式碼
 if __name__ == "__main__":
     def test_callback(symbol: str, price: float, exchange: str):
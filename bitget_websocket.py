@@ -1,4 +1,4 @@
-import json
+import orjson
 import threading
 import time
 from typing import Callable
@@ -25,27 +25,32 @@ class BitgetWebSocket(BasicWebSocket):
             message: 接收到的訊息
         """
         try:
-            data = json.loads(message)
+            # 心跳回覆是純文字 "pong"，不是 JSON，不必交給 parser
+            if message[:1] != b"{":
+                if message == b"pong":
+                    logger.debug("收到 Bitget WebSocket pong")
+                return
+
+            data = orjson.loads(message)
             # 處理組合串流格式
             if "data" in data and "arg" in data:
                 # Bitget trade stream 格式    
-                if "instId" in data["arg"] and "price" in data["data"][0]:        
-                    symbol_full = data["arg"]["instId"]  # ex. BTCUSDT
-                    if symbol_full.endswith('USDT'):
-                        symbol = symbol_full[:-4]  #  BTC
-                        price = float(data["data"][0]["price"])
+                arg = data["arg"]
+                trade = data["data"][0]
+                if "instId" in arg and "price" in trade:
+                    symbol = self._full_to_base.get(arg["instId"])  # ex. BTCUSDT -> BTC，未訂閱的交易對為 None
+                    if symbol is not None:
+                        price = float(trade["price"])
 
-                        # 只有當價格變動時才 callback
-                        if symbol not in self.last_prices or self.last_prices[symbol] != price:
-                            self.last_prices[symbol] = price
+                        # 只有當價格變動時才 callback（第一次收到時 get 為 None，必定不相等）
+                        last_prices = self.last_prices
+                        if last_prices.get(symbol) != price:
+                            last_prices[symbol] = price
                             self.callback(symbol, price, 'bitget') 
-                            logger.debug(f"Bitget {symbol} 價格更新: ${price:,.2f}")
+                            logger.debug("Bitget %s 價格更新: $%.2f", symbol, price)
                         
-        except json.JSONDecodeError as e:
-            if "pong" in message:
-                logger.debug("收到 Bitget WebSocket pong")
-            else:
-                logger.error(f"JSON 解析錯誤: {e}")
+        except orjson.JSONDecodeError as e:
+            logger.error(f"JSON 解析錯誤: {e}")
         except Exception as e:
             logger.error(f"處理訊息時發生錯誤: {e}")
     
@@ -1,6 +1,6 @@
-import json
+import orjson
 import time
-from typing import Callable
+from typing import Callable, List
 from basic_websocket import BasicWebSocket
 import logging
 
@@ -23,24 +23,28 @@ class BybitWebSocket(BasicWebSocket):
             message: 接收到的訊息
         """
         try:
-            data = json.loads(message)
+            # 只有 topic 推送才有成交資料，pong 與訂閱回覆不必解析
+            if b'"topic"' not in message:
+                return
+
+            data = orjson.loads(message)
             # 處理組合串流格式
             if 'data' in data:
                 data = data['data'][0]
             # Bybit trade stream 格式            
             if 's' in data and 'p' in data:
-                symbol_full = data['s']  # ex. BTCUSDT
-                if symbol_full.endswith('USDT'):
-                    symbol = symbol_full[:-4]  #  BTC
+                symbol = self._full_to_base.get(data['s'])  # ex. BTCUSDT -> BTC，未訂閱的交易對為 None
+                if symbol is not None:
                     price = float(data['p'])
                     
-                    # 只有當價格變動時才 callback
-                    if symbol not in self.last_prices or self.last_prices[symbol] != price:
-                        self.last_prices[symbol] = price
+                    # 只有當價格變動時才 callback（第一次收到時 get 為 None，必定不相等）
+                    last_prices = self.last_prices
+                    if last_prices.get(symbol) != price:
+                        last_prices[symbol] = price
                         self.callback(symbol, price, 'bybit')
-                        logger.debug(f"Bybit {symbol} 價格更新: ${price:,.2f}")
+                        logger.debug("Bybit %s 價格更新: $%.2f", symbol, price)
                         
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"JSON 解析錯誤: {e}")
         except Exception as e:
             logger.error(f"處理訊息時發生錯誤: {e}")
@@ -54,19 +58,17 @@ class BybitWebSocket(BasicWebSocket):
             ]
         }
 
+    def _creat_bulk_subscribe_msgs(self, symbols: List[str], type: str):
+        """生成 Bybit 合併訂閱訊息（現貨每個請求最多 10 個 args）"""
+        return [{
+            "op": type,
+            "args": [f"publicTrade.{symbol}USDT" for symbol in symbols[i:i + 10]]
+        } for i in range(0, len(symbols), 10)]
+
     def _on_ping(self, ws, message): # TODO: Initiative ping if needed
         """WebSocket 收到 ping 時的callback"""
+        # 傳輸層 pong 由 websocket-client 自動回覆，不需要再送應用層訊息
         logger.debug("收到 Bybit WebSocket ping")
-        try:
-            if ws:
-                ws.send(json.dumps({
-                    "success": True,
-                    "ret_msg": "pong",
-                    "conn_id": "0970e817-426e-429a-a679-ff7f55e0b16a",
-                    "op": "ping"
-                }))
-        except Exception:
-            logger.exception("回覆 ping 時發生錯誤")
 
 
 # 測試用程式碼
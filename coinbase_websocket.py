@@ -1,6 +1,6 @@
-import json
+import orjson
 import time
-from typing import Callable
+from typing import Callable, List
 from basic_websocket import BasicWebSocket
 import logging
 
@@ -22,25 +22,39 @@ class CoinbaseWebSocket(BasicWebSocket):
             message: 接收到的訊息
         """
         try:
-            data = json.loads(message)
+            # 只有 ticker 訊息帶有 price，訂閱確認與 heartbeat 等訊息不必解析
+            if b'"price"' not in message:
+                return
+
+            data = orjson.loads(message)
             # 記錄並處理 Coinbase 的 ticker 訊息
-            # Coinbase product_id 形如 'BTC-USD' 或 'BTC-USDC' 等，用 '-' 分割較保險
+            # Coinbase product_id 形如 'BTC-USD' 或 'BTC-USDC' 等，只處理已訂閱的 -USDT 交易對
             if 'product_id' in data and 'price' in data:
-                symbol_full = data['product_id']  # ex. BTC-USDT
-                if symbol_full.endswith('USDT'):
-                    symbol = symbol_full[:-5]  #  BTC
-                    price = float(data['price'])
-                    # 只有當價格變動時才 callback
-                    if symbol not in self.last_prices or self.last_prices[symbol] != price:
-                        self.last_prices[symbol] = price
+                symbol = self._full_to_base.get(data['product_id'])  # ex. BTC-USDT -> BTC，未訂閱的交易對為 None
+                if symbol is not None:
+                    # 價格字串與上次相同時不必再轉成 float
+                    price_str = data['price']
+                    last_price_str = self._last_price_str
+                    if last_price_str.get(symbol) == price_str:
+                        return
+                    last_price_str[symbol] = price_str
+                    price = float(price_str)
+                    # 只有當價格變動時才 callback（第一次收到時 get 為 None，必定不相等）
+                    last_prices = self.last_prices
+                    if last_prices.get(symbol) != price:
+                        last_prices[symbol] = price
                         self.callback(symbol, price, 'coinbase')
-                        logger.debug(f"Coinbase {symbol} 價格更新: ${price:,.2f}")
+                        logger.debug("Coinbase %s 價格更新: $%.2f", symbol, price)
                         
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"JSON 解析錯誤: {e}")
         except Exception as e:
             logger.error(f"處理訊息時發生錯誤: {e}")
 
+    def _full_symbol(self, symbol: str) -> str:
+        """Coinbase 交易對名稱 e.g. BTC -> BTC-USDT"""
+        return f"{symbol}-USDT"
+
     def _creat_subscribe_msg(self, symbol: str, type: str):
         """生成 Coinbase 訂閱訊息"""
         # 使用 USD 為 Coinbase 的主要報價對 (Coinbase 常用 -USD/-USDC，而非 -USDT)
@@ -52,6 +66,14 @@ class CoinbaseWebSocket(BasicWebSocket):
             ],
             "channels": ["ticker"]
         }
+
+    def _creat_bulk_subscribe_msgs(self, symbols: List[str], type: str):
+        """生成 Coinbase 合併訂閱訊息，product_ids 可一次帶入多個交易對"""
+        return [{
+            "type": type,
+            "product_ids": [f"{symbol}-USDT" for symbol in symbols],
+            "channels": ["ticker"]
+        }]
     
 # 測試用程式碼
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
-import json
+import orjson
 import time
-from typing import Callable
+from typing import Callable, List
 from basic_websocket import BasicWebSocket
 import logging
 
@@ -23,28 +23,42 @@ class OkxWebSocket(BasicWebSocket):
             message: 接收到的訊息
         """
         try:
-            data = json.loads(message)
+            # 只有成交推送帶有 px，訂閱事件回覆等訊息不必解析
+            if b'"px"' not in message:
+                return
+
+            data = orjson.loads(message)
             # 處理組合串流格式
             if 'data' in data:
                 data = data['data'][0]
             # OKX trade stream 格式            
             if 'instId' in data and 'px' in data:
-                symbol_full = data['instId']  # ex. BTC-USDT
-                if symbol_full.endswith('USDT'):
-                    symbol = symbol_full[:-5]  #  BTC
-                    price = float(data['px'])
+                symbol = self._full_to_base.get(data['instId'])  # ex. BTC-USDT -> BTC，未訂閱的交易對為 None
+                if symbol is not None:
+                    # 價格字串與上次相同時不必再轉成 float
+                    price_str = data['px']
+                    last_price_str = self._last_price_str
+                    if last_price_str.get(symbol) == price_str:
+                        return
+                    last_price_str[symbol] = price_str
+                    price = float(price_str)
 
-                    # 只有當價格變動時才 callback
-                    if symbol not in self.last_prices or self.last_prices[symbol] != price:
-                        self.last_prices[symbol] = price
+                    # 只有當價格變動時才 callback（第一次收到時 get 為 None，必定不相等）
+                    last_prices = self.last_prices
+                    if last_prices.get(symbol) != price:
+                        last_prices[symbol] = price
                         self.callback(symbol, price, 'okx')
-                        logger.debug(f"OKX {symbol} 價格更新: ${price:,.2f}")
+                        logger.debug("OKX %s 價格更新: $%.2f", symbol, price)
                         
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"JSON 解析錯誤: {e}")
         except Exception as e:
             logger.error(f"處理訊息時發生錯誤: {e}")
 
+    def _full_symbol(self, symbol: str) -> str:
+        """OKX 交易對名稱 e.g. BTC -> BTC-USDT"""
+        return f"{symbol}-USDT"
+
     def _creat_subscribe_msg(self, symbol: str, type: str):
         """生成 OKX 訂閱訊息"""
         return {
@@ -54,14 +68,26 @@ class OkxWebSocket(BasicWebSocket):
                  "instId": f"{symbol}-USDT"}
             ]
         }
+
+    def _creat_bulk_subscribe_msgs(self, symbols: List[str], type: str):
+        """生成 OKX 合併訂閱訊息，args 可一次帶入多個頻道"""
+        return [{
+            "op": type,
+            "args": [
+                {"channel": "trades",
+                 "instId": f"{symbol}-USDT"}
+                for symbol in symbols
+            ]
+        }]
+
     def _on_ping(self, ws, message):
         """WebSocket 收到 ping 時的callback"""
         logger.debug("收到 OKX WebSocket ping")
         try:
             if ws:
-                ws.send(json.dumps({
+                ws.send(orjson.dumps({
                     "op": "pong"
-                }))
+                }).decode())
         except Exception:
             logger.exception("回覆 pong 時發生錯誤")
 